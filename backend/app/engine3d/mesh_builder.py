@@ -4,29 +4,120 @@ import uuid
 import os
 from PIL import Image
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import meshoptimizer as meshopt
+except ImportError:
+    meshopt = None
+
+
+def _extrude_cells(occ, ds, depth, w, h):
+    """
+    Walks a downsampled occupancy grid and emits a front (z=+depth/2) and a
+    back (z=-depth/2) quad per occupied cell, in pixel coordinates.
+    Buffers are sized up front so the loop never appends.
+    """
+    rows, cols = occ.shape
+    n = 0
+    for r in range(rows):
+        for c in range(cols):
+            if occ[r, c]:
+                n += 1
+
+    vertices = np.empty((n * 8, 3), dtype=np.float64)
+    faces = np.empty((n * 4, 3), dtype=np.int64)
+    half = depth / 2.0
+    back = n * 4 # Back vertices start after all front vertices
+
+    k = 0
+    for r in range(rows):
+        for c in range(cols):
+            if not occ[r, c]:
+                continue
+            x0 = c * ds; x1 = min(x0 + ds, w)
+            y0 = r * ds; y1 = min(y0 + ds, h)
+
+            v = k * 4
+            vertices[v, 0] = x0; vertices[v, 1] = y0
+            vertices[v + 1, 0] = x1; vertices[v + 1, 1] = y0
+            vertices[v + 2, 0] = x1; vertices[v + 2, 1] = y1
+            vertices[v + 3, 0] = x0; vertices[v + 3, 1] = y1
+            for j in range(4):
+                vertices[v + j, 2] = half
+                vertices[back + v + j, 0] = vertices[v + j, 0]
+                vertices[back + v + j, 1] = vertices[v + j, 1]
+                vertices[back + v + j, 2] = -half
+
+            # Front faces, then back faces with reversed winding
+            f = k * 2
+            faces[f, 0] = v; faces[f, 1] = v + 1; faces[f, 2] = v + 2
+            faces[f + 1, 0] = v; faces[f + 1, 1] = v + 2; faces[f + 1, 2] = v + 3
+            b = n * 2 + f
+            faces[b, 0] = back + v; faces[b, 1] = back + v + 2; faces[b, 2] = back + v + 1
+            faces[b + 1, 0] = back + v; faces[b + 1, 1] = back + v + 3; faces[b + 1, 2] = back + v + 2
+            k += 1
+
+    return vertices, faces
+
+
+def _extrude_cells_numpy(occ, ds, depth, w, h):
+    """
+    Vectorized equivalent of `_extrude_cells` for when numba isn't installed.
+    """
+    r, c = np.nonzero(occ)
+    n = len(r)
+    x0 = c * ds; x1 = np.minimum(x0 + ds, w)
+    y0 = r * ds; y1 = np.minimum(y0 + ds, h)
+
+    quad_x = np.stack([x0, x1, x1, x0], axis=1).reshape(-1)
+    quad_y = np.stack([y0, y0, y1, y1], axis=1).reshape(-1)
+    half = depth / 2.0
+    front = np.column_stack([quad_x, quad_y, np.full(n * 4, half)])
+    back = np.column_stack([quad_x, quad_y, np.full(n * 4, -half)])
+    vertices = np.concatenate([front, back]).astype(np.float64)
+
+    v = (np.arange(n) * 4)[:, None]
+    front_faces = np.stack([v + [0, 1, 2], v + [0, 2, 3]], axis=1).reshape(-1, 3)
+    back_faces = np.stack([v + [0, 2, 1], v + [0, 3, 2]], axis=1).reshape(-1, 3) + n * 4
+    faces = np.concatenate([front_faces, back_faces]).astype(np.int64)
+    return vertices, faces
+
+
+_extrude_mask_numba = njit(cache=True, fastmath=True)(_extrude_cells) if njit else None
+
+
 class MeshBuilder:
     def __init__(self, output_dir="./output_assets"):
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
+        # Decoded source images keyed by path (every part of a scan shares one image)
+        self._image_cache = {}
 
     def create_part(self, original_image_path, segment_data, depth_map=None):
         """
         Takes a single SAM segment and turns it into a .glb file.
         """
-        # 1. Load Originals
-        img = Image.open(original_image_path).convert("RGB")
-        img_np = np.array(img)
-        mask = segment_data['mask']
+        # 1. Load Originals (decoded once per image, not once per part)
+        img_np = self._load_image(original_image_path)
+        # The scanner stores the mask already cropped to the bbox and bit-packed
+        crop_mask = self._unpack_mask(segment_data)
         
         # 2. Crop the image to the bbox (Optimization: Don't use full texture for small screw)
-        x, y, w, h = [int(v) for v in segment_data['bbox']]
+        # bbox is [x0, y0, x1, y1]; the mask crop starts at (int(x0), int(y0))
+        x, y = max(0, int(segment_data['bbox'][0])), max(0, int(segment_data['bbox'][1]))
+        h, w = crop_mask.shape
         # Add padding?
-        crop_img = img_np[y:y+h, x:x+w]
-        crop_mask = mask[y:y+h, x:x+w]
+        crop_img = img_np[y:y+h, x:x+w] # View, no copy
         
         # 3. Generate Geometry
         # If we have a depth map, we use it. If not, we make a "Pill" shape (extrusion)
         mesh = self._extrude_mask(crop_mask, depth=10.0)
+        # Reorder for GPU cache efficiency before UVs are derived from the vertices
+        mesh = self._optimize_mesh(mesh)
         
         # 4. Apply Texture
         # Create a material from the cropped image
@@ -35,7 +126,7 @@ class MeshBuilder:
         uv_layer = self._generate_planar_uvs(mesh, w, h)
         mesh.visual = trimesh.visual.TextureVisuals(
             uv=uv_layer,
-            image=Image.fromarray(crop_img)
+            image=Image.fromarray(np.ascontiguousarray(crop_img))
         )
 
         # 5. Export
@@ -48,30 +139,90 @@ class MeshBuilder:
             "position_offset": [x, y] # We need to know where to put it back in 3D space
         }
 
+    def _unpack_mask(self, segment_data):
+        h, w = segment_data['mask_shape']
+        return np.unpackbits(segment_data['mask_packed'], axis=-1, count=w).astype(bool)
+
+    def _load_image(self, path):
+        if path not in self._image_cache:
+            img = Image.open(path)
+            if img.mode != "RGB": img = img.convert("RGB") # Only copy when we must
+            self._image_cache[path] = np.asarray(img)
+        return self._image_cache[path]
+
     def _extrude_mask(self, mask, depth=5.0):
         """
         Simple algorithm: 
-        1. Find contours of the mask.
-        2. Triangulate the 2D shape.
-        3. Extrude it along Z axis.
+        Treat the mask as a heightmap where mask=1 is height=depth, and emit a
+        front and back quad for every occupied cell of a downsampled grid.
         """
-        # This is a simplification. For robust meshing, we'd use marching cubes
-        # or simpler: treat it as a heightmap where mask=1 is height=depth
-        
-        # Create a grid of vertices
         h, w = mask.shape
         # Downsample for performance (don't make 1 vertex per pixel!)
         scale = 0.1 
-        
-        # Placeholder: Returning a simple box for the bounding box
-        # In production, use `trimesh.creation.extrude_polygon` on the mask contour
-        box = trimesh.creation.box(extents=[w, h, depth])
-        return box
+        ds = max(1, int(round(1 / scale)))
+        occ = np.ascontiguousarray(mask[::ds, ::ds], dtype=np.uint8)
+
+        if not occ.any():
+            # Nothing to extrude: fall back to a simple box for the bounding box
+            return trimesh.creation.box(extents=[w, h, depth])
+
+        extrude = _extrude_mask_numba or _extrude_cells_numpy
+        vertices, faces = extrude(occ, ds, float(depth), w, h)
+        return trimesh.Trimesh(vertices=vertices, faces=faces)
+
+    def _optimize_mesh(self, mesh):
+        """
+        Reorders triangles for the vertex cache / overdraw (meshoptimizer, if
+        installed) and vertices by first use, so the Three.js viewer streams
+        them in order.
+        """
+        if len(mesh.faces) == 0:
+            return mesh
+
+        indices = np.ascontiguousarray(mesh.faces, dtype=np.uint32).reshape(-1)
+        n_idx, n_vtx = len(indices), len(mesh.vertices)
+
+        if meshopt is not None:
+            try:
+                positions = np.ascontiguousarray(mesh.vertices, dtype=np.float32)
+                cache_opt = np.empty_like(indices)
+                meshopt.optimize_vertex_cache(cache_opt, indices, n_idx, n_vtx)
+                overdraw_opt = np.empty_like(indices)
+                meshopt.optimize_overdraw(overdraw_opt, cache_opt, positions, n_idx, n_vtx, 1.05)
+                indices = overdraw_opt
+            except Exception as e:
+                print(f"   ⚠️ meshoptimizer pass skipped ({e})")
+
+        # Vertex fetch: renumber vertices in order of first use (same as optimizeVertexFetch)
+        used, first_use = np.unique(indices, return_index=True)
+        order = used[np.argsort(first_use)]
+        remap = np.empty(n_vtx, dtype=np.int64)
+        remap[order] = np.arange(len(order))
+
+        return trimesh.Trimesh(
+            vertices=mesh.vertices[order],
+            faces=remap[indices].reshape(-1, 3),
+            process=False
+        )
 
     def _generate_planar_uvs(self, mesh, width, height):
         # Map XY coordinates to UV 0-1
-        uvs = mesh.vertices[:, :2] # Take X and Y
+        uvs = mesh.vertices[:, :2].copy() # Take X and Y (copy: don't rescale the mesh itself)
         # Normalize
         uvs[:, 0] /= width
         uvs[:, 1] /= height
-        return uvs
\ No newline at end of file
+        return uvs
+
+
+# One MeshBuilder per worker process, so each worker decodes the image only once
+_worker_builder = None
+
+def build_part(output_dir, image_path, seg):
+    """
+    Process-pool entry point (see run_pipeline). Segments carry bit-packed masks,
+    so IPC stays small.
+    """
+    global _worker_builder
+    if _worker_builder is None:
+        _worker_builder = MeshBuilder(output_dir=output_dir)
+    return _worker_builder.create_part(image_path, seg)
@@ -1,19 +1,22 @@
 import argparse
-import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import orjson
 
 # --- FIX IMPORT PATHS ---
 try:
     # 1. Try Absolute Import (Works for: python -m app.engine3d.run_pipeline)
     from app.engine3d.sam3_wrapper import SAM3Scanner
-    from app.engine3d.mesh_builder import MeshBuilder
+    from app.engine3d.mesh_builder import build_part
 except ImportError:
     # 2. Fallback to Relative Path (Works for: python run_pipeline.py inside the folder)
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     try:
         from sam3_wrapper import SAM3Scanner
-        from mesh_builder import MeshBuilder
+        from mesh_builder import build_part
     except ImportError as e:
         print(f"❌ Critical Import Error: {e}")
         print("   Make sure you are running this from the 'backend' root directory.")
@@ -24,6 +27,24 @@ def estimate_depth(image_path):
     print("Estimating depth map (Mock)...")
     return None 
 
+def _part_metadata(seg, result):
+    # Calculate the "Explosion Vector"
+    # Logic: If it's a small part (screw), explode further out. 
+    # If it's big (body), stay close.
+    area_ratio = (seg['bbox'][2] * seg['bbox'][3]) / 10000
+    z_dist = 50 if area_ratio < 50 else 10
+
+    part_metadata = {
+        "id": seg['id'],
+        "mesh_url": result['mesh_path'],
+        "original_bbox": seg['bbox'],
+        "transforms": {
+            "origin": {"x": result['position_offset'][0], "y": result['position_offset'][1], "z": 0},
+            "explode_to": {"x": 0, "y": 0, "z": z_dist}
+        }
+    }
+    return part_metadata
+
 def main():
     parser = argparse.ArgumentParser(description="Run the SAM 3 Explosion Pipeline")
     parser.add_argument("--image", type=str, required=True, help="Path to input image")
@@ -33,7 +54,7 @@ def main():
     # 1. Initialize Engines
     try:
         scanner = SAM3Scanner()
-        builder = MeshBuilder(output_dir=args.output)
+        os.makedirs(args.output, exist_ok=True)
     except Exception as e:
         print(f"❌ Engine Initialization Failed: {e}")
         return
@@ -59,32 +80,22 @@ def main():
     }
 
     print("   > Generating 3D meshes...")
-    for i, seg in enumerate(segments):
-        print(f"     - Meshing part {i+1}/{len(segments)} ({seg['id']})...")
-        
-        result = builder.create_part(args.image, seg)
-        
-        # Calculate the "Explosion Vector"
-        # Logic: If it's a small part (screw), explode further out. 
-        # If it's big (body), stay close.
-        area_ratio = (seg['bbox'][2] * seg['bbox'][3]) / 10000
-        z_dist = 50 if area_ratio < 50 else 10
-
-        part_metadata = {
-            "id": seg['id'],
-            "mesh_url": result['mesh_path'],
-            "original_bbox": seg['bbox'],
-            "transforms": {
-                "origin": {"x": result['position_offset'][0], "y": result['position_offset'][1], "z": 0},
-                "explode_to": {"x": 0, "y": 0, "z": z_dist}
-            }
-        }
-        manifest['parts'].append(part_metadata)
+    # Parts are independent, so mesh them in parallel across cores. The worker
+    # function lives in mesh_builder (no torch import), so spawned workers don't
+    # re-import torch/SAM 3 just to run numpy/trimesh
+    build = partial(build_part, args.output, args.image)
+    with ProcessPoolExecutor(max_workers=min(len(segments), os.cpu_count() or 1)) as pool:
+        results = pool.map(build, segments)
+
+        for i, (seg, result) in enumerate(zip(segments, results)):
+            print(f"     - Meshed part {i+1}/{len(segments)} ({seg['id']})")
+            manifest['parts'].append(_part_metadata(seg, result))
 
     # 5. Save Manifest
     manifest_path = os.path.join(args.output, "explosion_manifest.json")
-    with open(manifest_path, "w") as f:
-        json.dump(manifest, f, indent=2)
+    # orjson serializes the raw numpy bboxes directly (no per-value float() casts)
+    with open(manifest_path, "wb") as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
     print(f"✅ Done! Manifest saved to {manifest_path}")
     print("   Load this JSON in your React Three.js Frontend.")
@@ -3,24 +3,38 @@ import numpy as np
 from PIL import Image
 import os
 import sys
-from unittest.mock import MagicMock
+import types
+from collections import OrderedDict
 
 # --- 1. MAC/M4 COMPATIBILITY HACK ---
 # SAM 3 depends on CUDA libraries (triton, flash_attn) that don't exist on Mac.
-# We mock them BEFORE importing sam3 so it doesn't crash.
+# We stub them BEFORE importing sam3 so it doesn't crash.
+class _NullMod(types.ModuleType):
+    """
+    Bare stand-in module: any attribute is another stub, and calling it returns
+    itself (so decorators like @triton.jit still work). No mock bookkeeping.
+    """
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return _NullMod(f"{self.__name__}.{name}")
+
+    def __call__(self, *args, **kwargs):
+        return self
+
 try:
     import triton
 except ImportError:
-    sys.modules["triton"] = MagicMock()
+    sys.modules["triton"] = _NullMod("triton")
 
 try:
     import flash_attn
 except ImportError:
-    # Mock the package and common submodules
-    flash_mock = MagicMock()
-    sys.modules["flash_attn"] = flash_mock
-    sys.modules["flash_attn.flash_attn_interface"] = flash_mock
-    sys.modules["flash_attn.bert_padding"] = flash_mock
+    # Stub the package and common submodules
+    flash_stub = _NullMod("flash_attn")
+    sys.modules["flash_attn"] = flash_stub
+    sys.modules["flash_attn.flash_attn_interface"] = flash_stub
+    sys.modules["flash_attn.bert_padding"] = flash_stub
 
 # --- 2. OFFICIAL SAM 3 IMPORT ---
 try:
@@ -36,8 +50,12 @@ except ImportError as e:
 
 class SAM3Scanner:
     def __init__(self, checkpoint_path="./checkpoints/sam3_hiera_large.pt"):
-        # Detect M4 Metal Acceleration
-        if torch.backends.mps.is_available():
+        # Detect CUDA, then M4 Metal Acceleration
+        if torch.cuda.is_available():
+            self.device = "cuda"
+            self.dtype = torch.float16
+            print("🟢 Hardware: CUDA Acceleration ON")
+        elif torch.backends.mps.is_available():
             self.device = "mps"
             self.dtype = torch.float16
             print("🍏 Hardware: Apple Metal (MPS) Acceleration ON")
@@ -48,6 +66,10 @@ class SAM3Scanner:
 
         self.model = None
         self.processor = None
+
+        # Image embeddings keyed by file fingerprint, so repeat scans skip set_image
+        self._embed_cache = OrderedDict()
+        self._embed_cache_size = 4
         
         # 3. Load the Brain
         if build_sam3_image_model:
@@ -72,9 +94,8 @@ class SAM3Scanner:
                     print(f"   ⚠️ Weight load issue ({load_err}). Trying default init.")
                     self.model = build_sam3_image_model()
 
+                # Weights stay fp32; scan_image autocasts activations to self.dtype
                 self.model.to(device=self.device)
-                if self.dtype == torch.float16:
-                    self.model.half()
                 
                 self.processor = Sam3Processor(self.model)
                 print("✅ SAM 3 Processor Ready")
@@ -90,66 +111,84 @@ class SAM3Scanner:
         """
         try:
             print(f"📷 Scanning: {image_path}")
-            image = Image.open(image_path).convert("RGB")
+            image = Image.open(image_path)
+            if image.mode != "RGB": image = image.convert("RGB") # Only copy when we must
             
             if self.processor:
-                # 1. Ingest Image
-                inference_state = self.processor.set_image(image)
+                # Frozen inference: no autograd bookkeeping, fp16 activations on GPU
+                with torch.inference_mode(), self._autocast():
+                    # 1. Ingest Image (cached across scans of the same file)
+                    inference_state = self._get_inference_state(image_path, image)
                 
-                # 2. Prompt for "parts" to explode the object
-                # Since SAM 3 is open-vocab, we ask for parts generic enough to cover the object
-                prompts = ["part", "component", "item", "object", "screw", "fastener"]
+                    # 2. Prompt for "parts" to explode the object
+                    # Since SAM 3 is open-vocab, we ask for parts generic enough to cover the object
+                    prompts = ["part", "component", "item", "object", "screw", "fastener"]
                 
-                all_segments = []
-                seen_bboxes = []
-
-                print(f"   -> Prompting SAM 3 with: {prompts}")
-                for p in prompts:
-                    output = self.processor.set_text_prompt(state=inference_state, prompt=p)
-                    
-                    if output["masks"] is not None:
+                    all_segments = []
+                    seen_bboxes = np.empty((0, 4), dtype=np.float32)
+                    seen_areas = np.empty((0,), dtype=np.float32)
+                    img_area = image.width * image.height
+
+                    print(f"   -> Prompting SAM 3 with: {prompts}")
+                    # Run every prompt on-device first; results stay on the GPU until one bulk copy
+                    batches = []
+                    for p in prompts:
+                        output = self.processor.set_text_prompt(state=inference_state, prompt=p)
+                        if output["masks"] is None: continue
+
                         # Extract Tensors
                         masks = output["masks"] # [N, H, W]
                         boxes = output["boxes"]
                         scores = output["scores"]
-                        
-                        # Convert to Numpy for processing
-                        masks_np = masks.detach().cpu().float().numpy()
-                        boxes_np = boxes.detach().cpu().numpy()
-                        scores_np = scores.detach().cpu().numpy()
-
-                        for i in range(len(masks_np)):
-                            score = float(scores_np[i])
-                            if score < 0.3: continue # Filter weak predictions
-
-                            bbox = boxes_np[i]
-                            
-                            # Simple Deduplication: If bbox is identical to one we have, skip
-                            is_duplicate = False
-                            for seen in seen_bboxes:
-                                iou = self._bbox_iou(bbox, seen)
-                                if iou > 0.8: # 80% overlap = duplicate
-                                    is_duplicate = True
-                                    break
-                            
-                            if is_duplicate: continue
-
-                            mask_bool = masks_np[i] > 0
-                            if mask_bool.ndim > 2: mask_bool = mask_bool.squeeze()
-                            
-                            all_segments.append({
-                                "id": f"{p}_{i}",
-                                "mask": mask_bool,
-                                "bbox": bbox,
-                                "score": score
-                            })
-                            seen_bboxes.append(bbox)
+
+                        # Filter on-device so discarded masks are never copied:
+                        # weak predictions, sub-pixel junk, and near-full-frame "object" boxes
+                        box_area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+                        keep = (scores >= 0.3) & (box_area > 64) & (box_area < 0.9 * img_area)
+                        H, W = masks.shape[-2:]
+                        batches.append((
+                            p,
+                            torch.nonzero(keep).flatten(),
+                            # Threshold before the copy: 1 byte/pixel crosses the bus instead of 4
+                            (masks[keep] > 0).reshape(-1, H, W),
+                            boxes[keep].reshape(-1, 4).float(),
+                            scores[keep].reshape(-1).float(),
+                        ))
+
+                if batches:
+                    # Single device -> host trip for all prompts
+                    src_idx_all = torch.cat([b[1] for b in batches]).cpu().numpy()
+                    masks_all = torch.cat([b[2] for b in batches]).to("cpu", dtype=torch.bool).numpy()
+                    boxes_all = torch.cat([b[3] for b in batches]).cpu().numpy()
+                    scores_all = torch.cat([b[4] for b in batches]).cpu().numpy()
+                    offsets = np.cumsum([0] + [len(b[4]) for b in batches])
+                    areas_all = self._bbox_areas(boxes_all) # Once, reused by every IoU below
+
+                    # Deduplicate prompt by prompt, so earlier prompts keep priority
+                    for (p, *_), start, stop in zip(batches, offsets[:-1], offsets[1:]):
+                        boxes_np = boxes_all[start:stop]
+                        scores_np = scores_all[start:stop]
+                        areas_np = areas_all[start:stop]
+                        keep_idx = self._dedup_boxes(boxes_np, scores_np, areas_np, seen_bboxes, seen_areas)
+
+                        all_segments.extend({
+                            "id": f"{p}_{src_idx_all[start + i]}",
+                            **self._pack_mask(masks_all[start + i], boxes_np[i]),
+                            "bbox": boxes_np[i],
+                            "score": float(scores_np[i])
+                        } for i in keep_idx)
+
+                        seen_bboxes = np.concatenate([seen_bboxes, boxes_np[keep_idx].reshape(-1, 4)])
+                        seen_areas = np.concatenate([seen_areas, areas_np[keep_idx]])
+
+                if self.device == "mps":
+                    torch.mps.empty_cache()
 
                 print(f"   -> Found {len(all_segments)} unique parts.")
                 return all_segments
             else:
                 print("⚠️ Using MOCK Data (Processor not loaded)")
-                return self._generate_mock_segments(np.array(image))
+                return self._generate_mock_segments(np.asarray(image))
                 
         except Exception as e:
             print(f"❌ Scan Error: {e}")
@@ -157,16 +196,90 @@ class SAM3Scanner:
             traceback.print_exc()
             return []
 
+    def _autocast(self):
+        return torch.autocast(device_type=self.device, dtype=self.dtype,
+                              enabled=self.dtype == torch.float16)
+
+    def _get_inference_state(self, image_path, image):
+        """
+        Returns the SAM 3 image embedding for `image`, reusing the cached one
+        if the file at `image_path` hasn't changed since it was last scanned.
+        """
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+
+        if key in self._embed_cache:
+            print("   -> Reusing cached image embedding")
+            self._embed_cache.move_to_end(key)
+            return self._embed_cache[key]
+
+        inference_state = self.processor.set_image(image)
+        self._embed_cache[key] = inference_state
+        if len(self._embed_cache) > self._embed_cache_size:
+            self._embed_cache.popitem(last=False) # Evict oldest
+        return inference_state
+
+    def _pack_mask(self, mask_bool, bbox):
+        """
+        Crops a full-image mask to its [x0, y0, x1, y1] bbox and packs it to
+        1 bit/pixel. The crop starts at (int(x0), int(y0)); MeshBuilder relies on that.
+        """
+        h, w = mask_bool.shape
+        x0, y0 = max(0, int(bbox[0])), max(0, int(bbox[1]))
+        x1, y1 = min(w, int(np.ceil(bbox[2]))), min(h, int(np.ceil(bbox[3])))
+        crop = mask_bool[y0:y1, x0:x1]
+        return {"mask_packed": np.packbits(crop, axis=-1), "mask_shape": crop.shape}
+
     def _bbox_iou(self, boxA, boxB):
-        # Determine the (x, y)-coordinates of the intersection rectangle
-        xA = max(boxA[0], boxB[0])
-        yA = max(boxA[1], boxB[1])
-        xB = min(boxA[2], boxB[2])
-        yB = min(boxA[3], boxB[3])
-        interArea = max(0, xB - xA + 1) * max(0, yB - yA + 1)
-        boxAArea = (boxA[2] - boxA[0] + 1) * (boxA[3] - boxA[1] + 1)
-        boxBArea = (boxB[2] - boxB[0] + 1) * (boxB[3] - boxB[1] + 1)
-        return interArea / float(boxAArea + boxBArea - interArea)
+        # Scalar convenience wrapper around the vectorized IoU
+        return float(self._bbox_iou_matrix(boxA, boxB)[0, 0])
+
+    def _bbox_areas(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        return (boxes[:, 2] - boxes[:, 0] + 1) * (boxes[:, 3] - boxes[:, 1] + 1)
+
+    def _bbox_iou_matrix(self, boxes_a, boxes_b, areas_a=None, areas_b=None):
+        """
+        IoU between every box in A [N,4] and every box in B [M,4] -> [N,M].
+        Pass precomputed areas to skip recomputing them.
+        """
+        boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+        boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+
+        # (x, y)-coordinates of every intersection rectangle
+        xA = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+        yA = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+        xB = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+        yB = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+        inter = np.clip(xB - xA + 1, 0, None) * np.clip(yB - yA + 1, 0, None)
+
+        if areas_a is None: areas_a = self._bbox_areas(boxes_a)
+        if areas_b is None: areas_b = self._bbox_areas(boxes_b)
+        return inter / (areas_a[:, None] + areas_b[None, :] - inter)
+
+    def _dedup_boxes(self, boxes_np, scores_np, areas_np, seen_bboxes, seen_areas, iou_thresh=0.8):
+        """
+        Greedy (highest score first) deduplication of a prompt's boxes against
+        the boxes already kept from earlier prompts and against each other.
+        Returns the surviving indices into `boxes_np`.
+        """
+        # Highest score wins when two boxes overlap
+        order = np.argsort(-scores_np, kind="stable")
+        if order.size == 0:
+            return order
+
+        # 1. Drop anything that overlaps a box kept from a previous prompt
+        if len(seen_bboxes):
+            iou_seen = self._bbox_iou_matrix(boxes_np[order], seen_bboxes, areas_np[order], seen_areas)
+            order = order[(iou_seen <= iou_thresh).all(axis=1)]
+
+        # 2. Sweep the batch: each kept box suppresses lower-scored overlaps
+        iou = self._bbox_iou_matrix(boxes_np[order], boxes_np[order], areas_np[order], areas_np[order])
+        keep = np.ones(len(order), dtype=bool)
+        for j in range(len(order)):
+            if keep[j]:
+                keep[j + 1:] &= iou[j, j + 1:] <= iou_thresh
+        return order[keep]
 
     def _generate_mock_segments(self, image_np):
         h, w, _ = image_np.shape
@@ -176,5 +289,6 @@ class SAM3Scanner:
             mask = np.zeros((h, w), dtype=bool)
             start_y = int((h / 3) * i); end_y = int((h / 3) * (i + 1))
             mask[start_y:end_y, int(w*0.1):int(w*0.9)] = True
-            segments.append({"id": f"mock_{labels[i]}", "mask": mask, "bbox": [0, 0, 10, 10], "score": 0.99})
+            bbox = [int(w*0.1), start_y, int(w*0.9), end_y]
+            segments.append({"id": f"mock_{labels[i]}", **self._pack_mask(mask, bbox), "bbox": bbox, "score": 0.99})
         return segments
\ No newline at end of file
@@ -4,6 +4,7 @@ import json
 import os
 import sys
 import io
+import shutil
 import subprocess
 import platform
 import fal_client
@@ -11,63 +12,87 @@ from PIL import Image
 from dotenv import load_dotenv
 load_dotenv()
 
+# Optional: libvips resizes several times faster than stock Pillow on large photos.
+# (Alternatively, `pip install pillow-simd` speeds up the Pillow path with no code change.)
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
 # Load environment variables from .env file
 load_dotenv()
 
 # --- CONFIGURATION ---
 FAL_KEY = os.environ.get("FAL_KEY")
 OUTPUT_FILENAME = "trellis_model.glb"
+# Opt in with USE_VIPS=1 (off by default so Mac/M-series machines stay on Pillow)
+USE_VIPS = pyvips is not None and os.environ.get("USE_VIPS") == "1"
 
-def process_and_encode_image(image_path):
+def process_and_upload_image(image_path):
     """
     Resizes image to 1024x1024 (standard for Trellis), converts to PNG, 
-    and encodes to Base64.
+    and uploads it to fal storage. Returns the hosted URL.
     """
     if not os.path.exists(image_path):
         print(f"Error: Image not found at {image_path}")
         sys.exit(1)
 
     try:
-        with Image.open(image_path) as img:
-            img = img.convert("RGBA")
-            
-            # Resize/Crop to Square (1024x1024)
-            target_size = 1024
-            img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
-            
-            new_img = Image.new("RGBA", (target_size, target_size), (0, 0, 0, 0))
-            paste_x = (target_size - img.width) // 2
-            paste_y = (target_size - img.height) // 2
-            new_img.paste(img, (paste_x, paste_y))
-            
-            buffered = io.BytesIO()
-            new_img.save(buffered, format="PNG")
-            img_bytes = buffered.getvalue()
+        target_size = 1024
+        if USE_VIPS:
+            img_bytes = _resize_with_vips(image_path, target_size)
+        else:
+            with Image.open(image_path) as img:
+                img = img.convert("RGBA")
+                
+                # Resize/Crop to Square (1024x1024)
+                img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
+                
+                new_img = Image.new("RGBA", (target_size, target_size), (0, 0, 0, 0))
+                paste_x = (target_size - img.width) // 2
+                paste_y = (target_size - img.height) // 2
+                new_img.paste(img, (paste_x, paste_y))
+                
+                buffered = io.BytesIO()
+                new_img.save(buffered, format="PNG")
+                img_bytes = buffered.getvalue()
             
-            encoded_string = base64.b64encode(img_bytes).decode('utf-8')
-            return f"data:image/png;base64,{encoded_string}"
+        # Binary upload instead of a base64 data URL (~33% fewer bytes, no JSON-embedded blob)
+        return fal_client.upload(img_bytes, "image/png")
             
     except Exception as e:
         print(f"Error processing image: {e}")
         sys.exit(1)
 
 
-def _find_model_mesh(node):
+def _resize_with_vips(image_path, target_size):
+    """
+    libvips equivalent of the Pillow path: shrink-on-load thumbnail (never
+    upscales), then letterbox onto a transparent square canvas.
+    """
+    img = pyvips.Image.thumbnail(image_path, target_size, height=target_size, size="down")
+    img = img.colourspace("srgb")
+    if not img.hasalpha():
+        img = img.bandjoin(255)
+    img = img.gravity("centre", target_size, target_size, extend="background", background=[0, 0, 0, 0])
+    return img.write_to_buffer(".png")
+
+
+def _find_model_mesh(root):
     """
-    Recursively search a nested JSON-like structure for a `model_mesh` dict.
+    Depth-first search of a nested JSON-like structure for a `model_mesh` dict.
+    Iterative (explicit stack), stopping at the first hit.
     """
-    if isinstance(node, dict):
-        if "model_mesh" in node and isinstance(node["model_mesh"], dict):
-            return node["model_mesh"]
-        for value in node.values():
-            found = _find_model_mesh(value)
-            if found:
-                return found
-    elif isinstance(node, list):
-        for item in node:
-            found = _find_model_mesh(item)
-            if found:
-                return found
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            mesh = node.get("model_mesh")
+            if isinstance(mesh, dict) and mesh:
+                return mesh
+            stack.extend(reversed(node.values())) # Reversed so pop() keeps document order
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
     return None
 
 def open_file_in_default_viewer(filepath):
@@ -100,8 +125,8 @@ def main():
         return
 
     # 1. Process Image
-    print("Preprocessing image...")
-    b64_image = process_and_encode_image(image_path)
+    print("Preprocessing and uploading image...")
+    image_url = process_and_upload_image(image_path)
 
     # 2. Call fal-ai Trellis via official fal_client
     print("Calling fal-ai Trellis (fal-ai/trellis) via fal_client...")
@@ -116,8 +141,7 @@ def main():
         result = fal_client.subscribe(
             "fal-ai/trellis",
             arguments={
-                # Trellis supports URLs; fal often also accepts data URLs for images.
-                "image_url": b64_image,
+                "image_url": image_url,
                 "slat_cfg_scale": 3,
                 "ss_cfg_scale": 7.5,
                 "slat_sampling_steps": 25,
@@ -150,16 +174,19 @@ def main():
 
             print(f"\nDownloading 3D asset from: {file_url}")
             try:
-                file_resp = requests.get(file_url)
-                if file_resp.status_code != 200:
-                    print(f"Failed to download asset: {file_resp.status_code}")
-                    print(file_resp.text)
-                    return
-
-                # Use the Trellis-provided filename extension but save locally
-                local_path = os.path.join(os.getcwd(), file_name)
-                with open(local_path, "wb") as f:
-                    f.write(file_resp.content)
+                # Stream straight to disk instead of buffering the whole GLB in RAM.
+                # identity encoding so the raw socket bytes are the file bytes.
+                with requests.get(file_url, stream=True, timeout=60,
+                                  headers={"Accept-Encoding": "identity"}) as file_resp:
+                    if file_resp.status_code != 200:
+                        print(f"Failed to download asset: {file_resp.status_code}")
+                        print(file_resp.text)
+                        return
+
+                    # Use the Trellis-provided filename extension but save locally
+                    local_path = os.path.join(os.getcwd(), file_name)
+                    with open(local_path, "wb") as f:
+                        shutil.copyfileobj(file_resp.raw, f, length=1 << 20)
 
                 print(f"SUCCESS: Saved model asset to {local_path}")
                 open_file_in_default_viewer(local_path)
@@ -1,8 +1,19 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from app.routers import repair
+from app.services import factories
 
-app = FastAPI(title="RepairLens API", version="1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load models off the startup path; requests are served meanwhile
+    factories.warm_up_in_background()
+    yield
+    # Close pooled HTTP connections on shutdown
+    await factories.close_engines()
+
+app = FastAPI(title="RepairLens API", version="1.0", lifespan=lifespan)
 
 # Configure CORS (Allow your React frontend to talk to this)
 app.add_middleware(
@@ -13,6 +24,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress JSON responses. Starlette skips text/event-stream here; the SSE
+# endpoint compresses itself with a per-event flush (see routers/repair.py).
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Include the routers
 app.include_router(repair.router, prefix="/api/v1", tags=["repair"])
 
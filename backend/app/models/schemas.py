@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional, Any, Dict
 
 # Defines the structure of a single repair step
@@ -20,3 +20,18 @@ class RepairResponse(BaseModel):
 # Defines the output for the "Explode" view
 class SegmentationResponse(BaseModel):
     masks: List[Any]     # List of polygons/coordinates for Three.js
+
+# Gemini outputs, decoded and validated in one pass (pydantic-core) so malformed
+# responses fail at the call site instead of deep in the pipeline
+class SceneResult(BaseModel):
+    detected_objects: List[str] = []
+    target_object: str = ""
+    reasoning: str = "Selected most prominent object."
+    provisional_steps: List[RepairStep] = []
+    safety_warnings: List[str] = []
+
+class GenerativeResult(BaseModel):
+    steps: List[RepairStep] = []
+    safety_warnings: List[str] = []
+
+PolishedSteps = TypeAdapter(List[RepairStep])
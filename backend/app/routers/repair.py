@@ -1,17 +1,40 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse, ORJSONResponse, Response
 from typing import Optional
-import json
+import orjson
+import zlib
 import asyncio
-from app.services.reasoning_brain import RepairBrain
-from app.services.vision_engine import VisionEngine
+from app.services.factories import get_brain, get_vision
 from app.models.schemas import RepairResponse, SegmentationResponse
 
 router = APIRouter()
-brain = RepairBrain()
-vision = VisionEngine()
 
-@router.post("/analyze", response_model=RepairResponse)
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Reads an upload in a worker thread. Starlette spools large uploads to a
+    temp file, so a plain read would block the event loop on disk I/O.
+    """
+    return await asyncio.to_thread(file.file.read)
+
+async def get_engine(factory):
+    """
+    Fetches an engine singleton in a worker thread. While the startup warmup
+    is still building it, the factory blocks on its lock; doing that here
+    would freeze the whole event loop (SSE streams included).
+    """
+    return await asyncio.to_thread(factory)
+
+async def gzip_events(events):
+    """
+    Gzip an SSE stream without buffering: each event is sync-flushed so the
+    client can decode it as soon as it arrives.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    async for chunk in events:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+@router.post("/analyze", response_model=RepairResponse, response_class=ORJSONResponse)
 async def analyze_object(
     file: UploadFile = File(...),
     user_prompt: Optional[str] = Form(None)
@@ -25,9 +48,10 @@ async def analyze_object(
     """
     try:
         # Read image bytes
-        image_data = await file.read()
+        image_data = await read_upload(file)
         
         # 1. Run the "Brain" to get the repair plan (Path A or B)
+        brain = await get_engine(get_brain)
         repair_plan = await brain.process_request(image_data, user_prompt)
         
         return repair_plan
@@ -37,6 +61,7 @@ async def analyze_object(
 
 @router.post("/analyze-stream")
 async def analyze_stream(
+    request: Request,
     file: UploadFile = File(...),
     user_prompt: Optional[str] = Form(None)
 ):
@@ -44,29 +69,36 @@ async def analyze_stream(
     Streaming version of analyze endpoint.
     Sends logs in real-time via Server-Sent Events (SSE).
     """
+    # Read image bytes
+    image_data = await read_upload(file)
+
     async def generate():
         try:
-            # Read image bytes
-            image_data = await file.read()
-            
+            brain = await get_engine(get_brain)
             # Process with streaming logs
             async for event in brain.process_request_streaming(image_data, user_prompt):
                 # Send SSE formatted data
-                yield f"data: {json.dumps(event)}\n\n"
-                await asyncio.sleep(0.01)  # Small delay for client processing
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
                 
         except Exception as e:
             error_event = {"type": "error", "data": str(e)}
-            yield f"data: {json.dumps(error_event)}\n\n"
+            yield b"data: " + orjson.dumps(error_event) + b"\n\n"
     
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no"  # Disable nginx buffering
+    }
+    body = generate()
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        body = gzip_events(body)
+
     return StreamingResponse(
-        generate(),
+        body,
         media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"  # Disable nginx buffering
-        }
+        headers=headers
     )
 
 @router.post("/segment", response_model=SegmentationResponse)
@@ -75,6 +107,11 @@ async def segment_parts(file: UploadFile = File(...)):
     Called by Frontend when user clicks "Explode View".
     Returns SAM 3 masks/polygons for Three.js to render.
     """
-    image_data = await file.read()
+    image_data = await read_upload(file)
+    vision = await get_engine(get_vision)
     masks = await vision.generate_masks(image_data)
-    return {"masks": masks}
+    # Masks are dataclasses with NumPy polygons; orjson writes both directly (same JSON shape as before)
+    return Response(
+        content=orjson.dumps({"masks": masks}, option=orjson.OPT_SERIALIZE_NUMPY),
+        media_type="application/json"
+    )
@@ -0,0 +1,46 @@
+import threading
+from typing import Optional
+from app.services.reasoning_brain import RepairBrain
+from app.services.vision_engine import VisionEngine
+
+# Process-wide engines, shared by the API routes and the manual test scripts.
+# Created on first use, so importing this doesn't load Gemini/SAM up front. The
+# app's startup warms them on a background thread (warm_up_in_background), so
+# the locks keep that and a request from both building one. One lock per engine,
+# so the brain and SAM can still be built concurrently.
+_brain: Optional[RepairBrain] = None
+_vision: Optional[VisionEngine] = None
+_brain_lock = threading.Lock()
+_vision_lock = threading.Lock()
+
+def get_brain() -> RepairBrain:
+    global _brain
+    if _brain is None:
+        with _brain_lock:
+            if _brain is None:
+                _brain = RepairBrain()
+    return _brain
+
+def get_vision() -> VisionEngine:
+    global _vision
+    if _vision is None:
+        with _vision_lock:
+            if _vision is None:
+                _vision = VisionEngine()
+    return _vision
+
+def warm_up_in_background():
+    """
+    Builds both engines and runs a dummy SAM pass on a daemon thread, so the
+    server starts accepting requests immediately but the first /segment
+    doesn't pay the multi-second model load.
+    """
+    def run():
+        get_brain()
+        get_vision()._warmup()
+    threading.Thread(target=run, name="engine-warmup", daemon=True).start()
+
+async def close_engines():
+    # Close pooled HTTP connections
+    if _brain is not None:
+        await _brain.ifixit.aclose()
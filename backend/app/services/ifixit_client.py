@@ -1,43 +1,92 @@
+import asyncio
+import functools
 import httpx
+import orjson
+from cachetools import TTLCache
 from typing import Optional, Dict, Any, List
+from app.services.single_flight import cached_single_flight
+
+def _cached(fn):
+    """
+    TTL-caches an async iFixitClient method by its arguments. Concurrent misses
+    for the same key share one request (single-flight). Empty results and
+    failures aren't cached, so transient errors don't stick.
+    """
+    @functools.wraps(fn)
+    async def wrapper(self, *args):
+        key = (fn.__name__, *args)
+        return await cached_single_flight(self._cache, self._locks, key, lambda: fn(self, *args))
+    return wrapper
 
 class iFixitClient:
     BASE_URL = "https://www.ifixit.com/api/2.0"
 
+    def __init__(self):
+        # One pooled client for every call, so the search -> guides -> details
+        # sequence reuses a single keep-alive connection instead of a new TLS handshake each
+        self._client = httpx.AsyncClient(
+            base_url=self.BASE_URL,
+            # HTTP/2 multiplexes the guide-detail fan-out over that one connection;
+            # the guide JSON compresses 5-10x (br needs the brotli extra)
+            http2=True,
+            headers={"Accept-Encoding": "br, gzip", "User-Agent": "RepairBrain/1.0"},
+            timeout=httpx.Timeout(10.0),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=300),
+        )
+        # Guide content changes on the order of days; popular devices repeat constantly
+        self._cache = TTLCache(maxsize=1000, ttl=3600)
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    @_cached
     async def search_device(self, query: str) -> Optional[Dict[str, Any]]:
         """
         Search iFixit for a matching device.
         """
-        async with httpx.AsyncClient() as client:
-            # 'filter=category' ensures we find device categories, not just guides
-            response = await client.get(
-                f"{self.BASE_URL}/search/{query}",
-                params={"filter": "category", "limit": 1}
-            )
-            
-            if response.status_code == 200:
-                results = response.json().get("results", [])
-                if results:
-                    return results[0] # Return best match
+        # 'filter=category' ensures we find device categories, not just guides
+        response = await self._client.get(
+            f"/search/{query}",
+            params={"filter": "category", "limit": 1}
+        )
+        
+        if response.status_code == 200:
+            results = response.json().get("results", [])
+            if results:
+                return results[0] # Return best match
         return None
 
+    @_cached
     async def get_guides(self, device_id: str) -> list:
         """
         Fetch official guides for a device category.
         """
-        async with httpx.AsyncClient() as client:
-            # Using the wiki API to get guides associated with the category
-            response = await client.get(f"{self.BASE_URL}/wikis/CATEGORY/{device_id}")
-            if response.status_code == 200:
-                return response.json().get("guides", [])
+        # Using the wiki API to get guides associated with the category
+        response = await self._client.get(f"/wikis/CATEGORY/{device_id}")
+        if response.status_code == 200:
+            return response.json().get("guides", [])
         return []
 
+    @_cached
     async def get_guide_details(self, guide_id: int) -> Dict[str, Any]:
         """
         Fetch full details of a specific guide, including steps.
         """
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{self.BASE_URL}/guides/{guide_id}")
-            if response.status_code == 200:
-                return response.json()
+        response = await self._client.get(f"/guides/{guide_id}")
+        if response.status_code == 200:
+            guide = orjson.loads(response.content)
+            # Keep only what the brain reads; the full guide (images, tools, parts,
+            # comments) is 100+ KB and would otherwise sit in the cache too
+            return {
+                "guideid": guide.get("guideid"),
+                "title": guide.get("title"),
+                "steps": [
+                    {
+                        "title": step.get("title"),
+                        "lines": [{"text_raw": line.get("text_raw", "")} for line in step.get("lines", ())]
+                    }
+                    for step in guide.get("steps", ())
+                ]
+            }
         return {}
@@ -1,44 +1,238 @@
 import os
-import json
 import io
+import sys
+import queue
+import atexit
 import asyncio
+import hashlib
+import logging
+import logging.handlers
+from cachetools import TTLCache
 from typing import Dict, TypedDict, List, Any, Optional
-from PIL import Image
+from PIL import Image, ImageOps, UnidentifiedImageError
 import google.generativeai as genai
 from app.services.ifixit_client import iFixitClient
 from app.services.trellis_service import generate_exploded_model_url
 from app.core.config import settings
+from app.services.single_flight import cached_single_flight
+from app.models.schemas import SceneResult, GenerativeResult, PolishedSteps
 
 class RepairState(TypedDict):
     image_bytes: bytes
+    pil_image: Optional[Image.Image]
     user_prompt: Optional[str]
     reasoning_log: List[str]
     detected_objects: List[str]
     target_device: str
+    scene_ok: bool
     is_verified: bool
     repair_steps: list
+    provisional_steps: list
     safety_warnings: list
     guides_available: list
 
+# Structured-output schema for the fused scene call: Gemini is constrained to
+# exactly these fields, so target lock + ready-to-show steps come back in one trip
+class RepairStepSchema(TypedDict):
+    step: int
+    instruction: str
+    warning: str
+
+class SceneAnalysisSchema(TypedDict):
+    detected_objects: List[str]
+    target_object: str
+    reasoning: str
+    provisional_steps: List[RepairStepSchema]
+    safety_warnings: List[str]
+
+# Reasoning trace goes through a queue: the event loop only enqueues, and a
+# listener thread does the actual stdout writes
+logger = logging.getLogger("brain")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler(sys.stdout))
+_log_listener.start()
+atexit.register(_log_listener.stop) # Flush what's still queued on exit
+
+# Prompt templates, built once at import. The image and the static instructions
+# go first and only the per-request text goes last, so repeat calls share one
+# long identical prefix (Gemini's implicit context cache keys on the prefix).
+# Literal JSON braces are doubled where the template goes through str.format.
+_SCENE_INSTRUCTIONS = """
+Analyze this image. 
+1. List all distinct repairable objects you see.
+2. Based on the user's note (given at the end), identify which single object is the intended target for repair.
+3. If the user note is empty, pick the most prominent central object.
+4. Based on the visual evidence (screws, seams, clips), draft a step-by-step disassembly/repair guide for that target.
+   Focus on the specific issue if mentioned in the user's note.
+   Keep every instruction and warning CONCISE, clear, and user-friendly (one or two short sentences).
+
+Output valid JSON:
+{
+    "detected_objects": ["toaster", "table", "screwdriver"],
+    "target_object": "Sunbeam Toaster",
+    "reasoning": "User mentioned 'heating issue', which applies to the toaster, not the table.",
+    "provisional_steps": [
+        {"step": 1, "instruction": "Remove the 4 visible screws...", "warning": "Be careful of..."},
+        {"step": 2, "instruction": "Lift the back panel.", "warning": ""}
+    ],
+    "safety_warnings": ["Unplug device...", "Wear safety glasses..."]
+}
+Use an empty string for "warning" when a step has none.
+"""
+
+_SCENE_TAIL = 'User\'s note: "{user_context}"'
+
+_GENERATIVE_INSTRUCTIONS = """
+Create a repair guide for the device named at the end, using the context from the user given with it.
+
+Based on the visual evidence (screws, seams, clips), provide a step-by-step disassembly/repair guide.
+Focus on the specific issue if mentioned in the context.
+Keep every instruction and warning CONCISE, clear, and user-friendly (one or two short sentences).
+
+Output valid JSON format:
+{
+    "steps": [
+        {"step": 1, "instruction": "Remove the 4 visible screws...", "warning": "Be careful of..."}
+    ],
+    "safety_warnings": ["Unplug device...", "Wear safety glasses..."]
+}
+"""
+
+_GENERATIVE_TAIL = 'Device: \'{target}\'\nContext from user: "{user_context}".'
+
+_POLISH_PROMPT = """
+Rewrite these repair instructions to be CONCISE, clear, and user-friendly.
+
+Original steps:
+{steps_text}
+
+Output valid JSON array matching this format:
+[
+    {{"step": 1, "instruction": "Brief clear instruction", "warning": "Brief warning or null"}},
+    {{"step": 2, "instruction": "Brief clear instruction", "warning": null}}
+]
+
+Return exactly {n_steps} steps.
+"""
+
+_ELLIPSIS = "\u2026"
+
+# Process-wide handles: configured once, shared by every RepairBrain
+_MODEL = None
+_MODEL_READY = False
+_IFIXIT: Optional[iFixitClient] = None
+
+def _get_model():
+    global _MODEL, _MODEL_READY
+    if _MODEL_READY:
+        return _MODEL
+    _MODEL_READY = True
+
+    if settings.GOOGLE_API_KEY:
+        try:
+            genai.configure(api_key=settings.GOOGLE_API_KEY)
+            # Using gemini-2.5-flash as requested and available
+            _MODEL = genai.GenerativeModel('gemini-2.5-flash')
+            print("Reasoning Brain: Gemini 2.5 Flash Connected")
+        except Exception as e:
+            print(f"Reasoning Brain Error: Failed to configure Gemini: {e}")
+    else:
+        print("Reasoning Brain Warning: No GOOGLE_API_KEY found.")
+    return _MODEL
+
+def _get_ifixit() -> iFixitClient:
+    global _IFIXIT
+    if _IFIXIT is None:
+        _IFIXIT = iFixitClient()
+    return _IFIXIT
+
 class RepairBrain:
     def __init__(self):
-        self.ifixit = iFixitClient()
-        self.model = None
-        
-        if settings.GOOGLE_API_KEY:
+        self.ifixit = _get_ifixit()
+        self.model = _get_model()
+
+        # Gemini results keyed by (node, hash of image + prompt): re-submitting the
+        # same photo skips the model entirely. Failures are never stored.
+        self._results = TTLCache(maxsize=256, ttl=24 * 3600)
+        self._locks: Dict[tuple, asyncio.Lock] = {}
+
+    def _prepare_image(self, image_data: bytes, max_side: int = 1024, image: Optional[Image.Image] = None) -> bytes:
+        """
+        Shrinks the upload once to a <=1024px JPEG before it goes to Gemini.
+        Gemini downsamples internally anyway, so full-res phone photos only cost upload time.
+        `image` is an already-decoded copy of `image_data`, if the caller has one.
+        """
+        try:
+            img = image if image is not None else Image.open(io.BytesIO(image_data))
+            if max(img.size) <= max_side:
+                return image_data
+            img.draft("RGB", (max_side, max_side)) # JPEG: let libjpeg downscale during decode
+            img = ImageOps.exif_transpose(img).convert("RGB") # Keep phone photos upright (copies, so `image` is untouched)
+            img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=85)
+            return buf.getvalue()
+        except Exception as e:
+            logger.warning("Brain: Image downscale skipped (%s)", e)
+            return image_data
+
+    def _open_image(self, image_bytes: bytes) -> Optional[Image.Image]:
+        """
+        Decodes the prepared upload once per request; both Gemini nodes share it.
+        Tries the common formats first (skips Pillow's probe over every registered
+        plugin), then any format Pillow knows (GIF/BMP/TIFF uploads <= 1024px
+        reach here as-is).
+        """
+        try:
             try:
-                genai.configure(api_key=settings.GOOGLE_API_KEY)
-                # Using gemini-2.5-flash as requested and available
-                self.model = genai.GenerativeModel('gemini-2.5-flash')
-                print("Reasoning Brain: Gemini 2.5 Flash Connected")
-            except Exception as e:
-                print(f"Reasoning Brain Error: Failed to configure Gemini: {e}")
-        else:
-            print("Reasoning Brain Warning: No GOOGLE_API_KEY found.")
+                image = Image.open(io.BytesIO(image_bytes), formats=("JPEG", "PNG", "WEBP"))
+            except UnidentifiedImageError:
+                image = Image.open(io.BytesIO(image_bytes))
+            image.load()
+            return image
+        except Exception as e:
+            # Leave it to the nodes to fail (and fall back) as before
+            logger.warning("Brain: Image decode failed (%s)", e)
+            return None
+
+    def _content_key(self, state: RepairState, *extra: str) -> str:
+        h = hashlib.blake2b(state['image_bytes'], digest_size=16)
+        h.update((state.get('user_prompt') or '').encode())
+        for part in extra:
+            h.update(b"|" + part.encode())
+        return h.hexdigest()
+
+    async def _gemini_cached(self, node: str, state: RepairState, compute, *extra: str):
+        """
+        Returns the cached result of `compute(state)` for this image + prompt
+        (+ any `extra` inputs the node's prompt depends on), computing it at most
+        once at a time per key (single-flight). The trace lines the node logged
+        are cached with it and replayed on a hit.
+        Exceptions propagate and aren't cached.
+        """
+        key = (node, self._content_key(state, *extra))
+        computed = False
+
+        async def run():
+            nonlocal computed
+            computed = True
+            start = len(state['reasoning_log'])
+            result = await compute(state)
+            return result, state['reasoning_log'][start:]
+
+        result, log_lines = await cached_single_flight(self._results, self._locks, key, run)
+        if not computed:
+            self._log(state, f"Reusing cached {node} result for this image.")
+            for line in log_lines:
+                self._log(state, line)
+        return result
 
     def _log(self, state: RepairState, message: str):
         """Helper to add thoughts to the trace."""
-        print(f"Brain: {message}")
+        logger.info("Brain: %s", message)
         state['reasoning_log'].append(message)
 
     async def analyze_scene_node(self, state: RepairState):
@@ -48,48 +242,53 @@ class RepairBrain:
         """
         if not self.model:
              self._log(state, "AI offline. Defaulting to Unknown Device.")
-             return {"target_device": "Unknown Device (AI Offline)", "detected_objects": []}
+             return {"target_device": "Unknown Device", "detected_objects": [], "scene_ok": False}
 
         try:
-            image_bytes = state['image_bytes']
-            image = Image.open(io.BytesIO(image_bytes))
-            user_context = state.get('user_prompt') or "No specific context provided."
-            
-            self._log(state, f"Analyzing scene. User Context: '{user_context}'")
-
-            prompt = f"""
-            Analyze this image. 
-            1. List all distinct repairable objects you see.
-            2. Based on the user's note: "{user_context}", identify which single object is the intended target for repair.
-            3. If the user note is empty, pick the most prominent central object.
-            
-            Output valid JSON:
-            {{
-                "detected_objects": ["toaster", "table", "screwdriver"],
-                "target_object": "Sunbeam Toaster",
-                "reasoning": "User mentioned 'heating issue', which applies to the toaster, not the table."
-            }}
-            """
-            
-            response = self.model.generate_content(
-                [prompt, image],
-                generation_config={"response_mime_type": "application/json"}
-            )
-            
-            data = json.loads(response.text)
-            
-            target = data.get("target_object", "Unknown Object")
-            reasoning = data.get("reasoning", "Selected most prominent object.")
-            objects = data.get("detected_objects", [])
-            
-            self._log(state, f"Scene Analysis: Saw {objects}.")
-            self._log(state, f"Target Lock: Selected '{target}'. Reason: {reasoning}")
-            
-            return {"target_device": target, "detected_objects": objects}
-
+            return await self._gemini_cached("scene", state, self._analyze_scene)
         except Exception as e:
             self._log(state, f"Scene Analysis Failed: {e}")
-            return {"target_device": "Unknown Device", "detected_objects": []}
+            return {"target_device": "Unknown Device", "detected_objects": [], "scene_ok": False}
+
+    async def _analyze_scene(self, state: RepairState):
+        image = state['pil_image']
+        if image is None:
+            raise ValueError("Upload could not be decoded as an image")
+        user_context = state.get('user_prompt') or "No specific context provided."
+        
+        self._log(state, f"Analyzing scene. User Context: '{user_context}'")
+
+        tail = _SCENE_TAIL.format(user_context=user_context)
+        
+        response = await self.model.generate_content_async(
+            [image, _SCENE_INSTRUCTIONS, tail],
+            generation_config={
+                "response_mime_type": "application/json",
+                "response_schema": SceneAnalysisSchema
+            }
+        )
+        
+        result = SceneResult.model_validate_json(response.text)
+        
+        target = result.target_object or "Unknown Object"
+        reasoning = result.reasoning
+        objects = result.detected_objects
+        
+        self._log(state, f"Scene Analysis: Saw {objects}.")
+        self._log(state, f"Target Lock: Selected '{target}'. Reason: {reasoning}")
+        
+        # Provisional steps ride along so Path B doesn't need a second image upload.
+        # If Path A wins they're simply ignored.
+        return {
+            "target_device": target,
+            "detected_objects": objects,
+            "scene_ok": bool(result.target_object),
+            "provisional_steps": [
+                {**step.model_dump(), "warning": step.warning or None}
+                for step in result.provisional_steps
+            ],
+            "safety_warnings": result.safety_warnings
+        }
 
     async def ifixit_check_node(self, state: RepairState):
         """
@@ -97,7 +296,7 @@ class RepairBrain:
         """
         target = state['target_device']
         
-        if "Unknown" in target:
+        if not state.get('scene_ok'):
             return {"is_verified": False}
 
         self._log(state, f"Searching iFixit for '{target}'...")
@@ -113,21 +312,26 @@ class RepairBrain:
                 
                 if guides:
                     self._log(state, f"Found {len(guides)} verified guides.")
-                    # Fetch details for the first guide to populate 'steps'
-                    first_guide = guides[0]
-                    guide_id = first_guide.get('guideid')
+                    # Fetch details for the top guides concurrently, then use the
+                    # first one that actually has steps to populate 'steps'
+                    guide_ids = [g.get('guideid') for g in guides[:3] if g.get('guideid')]
+                    # (a failed fetch only drops that guide, not the whole Path A)
+                    candidates = await asyncio.gather(
+                        *[self.ifixit.get_guide_details(gid) for gid in guide_ids],
+                        return_exceptions=True
+                    )
+                    details = next((d for d in candidates if isinstance(d, dict) and d.get('steps')), None)
                     
                     verified_steps = []
-                    if guide_id:
-                        details = await self.ifixit.get_guide_details(guide_id)
-                        
+                    if details:
                         # Parse iFixit steps into our format
-                        raw_steps = details.get('steps', [])
+                        raw_steps = details.get('steps', ())
+                        append = verified_steps.append
                         for idx, s in enumerate(raw_steps):
-                            lines = s.get('lines', [])
-                            instruction_text = " ".join([l.get('text_raw', '') for l in lines])
+                            lines = s.get('lines', ())
+                            instruction_text = " ".join(l.get('text_raw', '') for l in lines)
                             
-                            verified_steps.append({
+                            append({
                                 "step": idx + 1,
                                 "instruction": instruction_text or s.get('title', 'Step'),
                                 "warning": None 
@@ -153,48 +357,48 @@ class RepairBrain:
             return self._mock_generative_steps()
 
         target = state['target_device']
+        if state.get('provisional_steps'):
+            self._log(state, f"Using {len(state['provisional_steps'])} repair steps drafted during scene analysis.")
+            return {
+                "repair_steps": state['provisional_steps'],
+                "safety_warnings": state.get('safety_warnings', [])
+            }
+
         self._log(state, f"Engaging Generative Repair Logic for '{target}'...")
 
         try:
-            image_bytes = state['image_bytes']
-            image = Image.open(io.BytesIO(image_bytes))
-            user_context = state.get('user_prompt', '')
-            
-            prompt = f"""
-            Create a repair guide for the '{target}'.
-            Context from user: "{user_context}".
-            
-            Based on the visual evidence (screws, seams, clips), provide a step-by-step disassembly/repair guide.
-            Focus on the specific issue if mentioned in the context.
-            
-            Output valid JSON format:
-            {{
-                "steps": [
-                    {{"step": 1, "instruction": "Remove the 4 visible screws...", "warning": "Be careful of..."}}
-                ],
-                "safety_warnings": ["Unplug device...", "Wear safety glasses..."]
-            }}
-            """
-            
-            response = self.model.generate_content(
-                [prompt, image], 
-                generation_config={"response_mime_type": "application/json"}
-            )
-            
-            data = json.loads(response.text)
-            steps = data.get("steps", [])
-            safety = data.get("safety_warnings", [])
-            
-            self._log(state, f"Generated {len(steps)} repair steps via Visual Analysis.")
-            
-            return {
-                "repair_steps": steps,
-                "safety_warnings": safety
-            }
+            # Keyed on the target too: a failed scene pass ("Unknown Device") must
+            # not serve its steps to a later request where the scene succeeds
+            return await self._gemini_cached("generative", state, self._generate_steps, state['target_device'])
         except Exception as e:
             self._log(state, f"Gemini Reasoning Failed: {e}")
             return self._mock_generative_steps()
 
+    async def _generate_steps(self, state: RepairState):
+        target = state['target_device']
+        image = state['pil_image']
+        if image is None:
+            raise ValueError("Upload could not be decoded as an image")
+        user_context = state.get('user_prompt', '')
+        
+        tail = _GENERATIVE_TAIL.format(target=target, user_context=user_context)
+        
+        response = await self.model.generate_content_async(
+            [image, _GENERATIVE_INSTRUCTIONS, tail],
+            generation_config={"response_mime_type": "application/json"}
+        )
+        
+        result = GenerativeResult.model_validate_json(response.text)
+        steps = [step.model_dump() for step in result.steps]
+        safety = result.safety_warnings
+        
+        self._log(state, f"Generated {len(steps)} repair steps via Visual Analysis.")
+        
+        return {
+            "repair_steps": steps,
+            "safety_warnings": safety
+        }
+
     def _mock_generative_steps(self):
         generated_steps = [
             {"step": 1, "instruction": "Remove the 4 visible Phillips screws on the back panel.", "warning": None},
@@ -203,6 +407,14 @@ class RepairBrain:
         safety = ["Unplug device before opening", "Capacitor discharge risk"]
         return {"repair_steps": generated_steps, "safety_warnings": safety}
 
+    def _needs_polish(self, steps: List[Dict], max_avg_words: int = 40) -> bool:
+        # The one "is this worth a Gemini round-trip" heuristic; callers check it
+        # before polish_all_steps
+        if not steps:
+            return False
+        words = sum(len((s.get('instruction') or '').split()) for s in steps)
+        return words / len(steps) > max_avg_words
+
     async def polish_all_steps(self, steps: List[Dict]) -> List[Dict]:
         """
         Polishes all repair steps in ONE batch request.
@@ -213,72 +425,97 @@ class RepairBrain:
         try:
             # If there are too many steps (e.g. > 30), just return originals to avoid context limits
             if len(steps) > 30:
-                print(f"Skipping polish: Too many steps ({len(steps)})")
+                logger.info("Brain: Skipping polish: Too many steps (%d)", len(steps))
                 return steps
 
             # Build a structured list of steps for the prompt
             steps_text = []
             for i, step in enumerate(steps):
-                instruction = step.get('instruction', '')
+                step_get = step.get
+                instruction = step_get('instruction', '')
                 # Truncate very long instructions to save tokens
-                if len(instruction) > 500: 
-                    instruction = instruction[:500] + "..."
+                if len(instruction) > 500:
+                    instruction = f"{instruction[:500]}{_ELLIPSIS}"
                     
-                step_entry = f"Step {step.get('step', i+1)}: {instruction}"
-                if step.get('warning'):
-                    step_entry += f" [WARNING: {step.get('warning')}]"
+                step_entry = f"Step {step_get('step', i+1)}: {instruction}"
+                warning = step_get('warning')
+                if warning:
+                    step_entry += f" [WARNING: {warning}]"
                 steps_text.append(step_entry)
             
-            prompt = f"""
-            Rewrite these repair instructions to be CONCISE, clear, and user-friendly.
-            
-            Original steps:
-            {chr(10).join(steps_text)}
-            
-            Output valid JSON array matching this format:
-            [
-                {{"step": 1, "instruction": "Brief clear instruction", "warning": "Brief warning or null"}},
-                {{"step": 2, "instruction": "Brief clear instruction", "warning": null}}
-            ]
-            
-            Return exactly {len(steps)} steps.
-            """
+            prompt = _POLISH_PROMPT.format(steps_text="\n".join(steps_text), n_steps=len(steps))
             
-            response = self.model.generate_content(
+            response = await self.model.generate_content_async(
                 prompt,
                 generation_config={"response_mime_type": "application/json"}
             )
             
-            polished_steps = json.loads(response.text)
+            polished_steps = [step.model_dump() for step in PolishedSteps.validate_json(response.text)]
             
             # Validate we got the right number of steps
             if len(polished_steps) != len(steps):
-                print(f"Warning: Expected {len(steps)} steps, got {len(polished_steps)}. Using originals.")
+                logger.warning("Brain: Expected %d polished steps, got %d. Using originals.", len(steps), len(polished_steps))
                 return steps
             
             return polished_steps
             
         except Exception as e:
-            print(f"Failed to polish steps in batch: {e}")
+            logger.warning("Brain: Failed to polish steps in batch: %s", e)
             # On error, return originals
             return steps
 
-    async def process_request(self, image_data: bytes, user_prompt: Optional[str] = None):
-        """
-        Orchestrates the flow with CoT.
-        """
-        state: RepairState = {
-            "image_bytes": image_data,
+    def _initial_state(self, image_bytes: bytes, pil_image: Optional[Image.Image], user_prompt: Optional[str]) -> RepairState:
+        return {
+            "image_bytes": image_bytes,
+            "pil_image": pil_image,
             "user_prompt": user_prompt,
             "reasoning_log": [],
             "detected_objects": [],
             "target_device": "",
+            "scene_ok": False,
             "is_verified": False,
             "repair_steps": [],
+            "provisional_steps": [],
             "safety_warnings": [],
             "guides_available": []
         }
-        
+
+    def prepare_inputs(self, image_data: bytes, image: Optional[Image.Image] = None):
+        """
+        Returns (image_bytes, pil_image) for a request. A caller that already
+        decoded the upload (e.g. for SAM) passes it as `image`; if no downscale
+        was needed it is reused as is instead of being decoded again.
+        Blocking (decode/resize/encode); callers on the event loop use to_thread.
+        Also public for callers that decode once and share the result with the
+        VisionEngine (pass the returned pair to process_request and generate_masks).
+        """
+        image_bytes = self._prepare_image(image_data, image=image)
+        if image is not None and image_bytes is image_data:
+            return image_bytes, image
+        return image_bytes, self._open_image(image_bytes)
+
+    async def process_request(self, image_data: bytes, user_prompt: Optional[str] = None, image: Optional[Image.Image] = None):
+        """
+        Orchestrates the flow with CoT.
+        """
+        # Decode/resize/re-encode is CPU-bound: keep it off the event loop
+        image_bytes, pil_image = await asyncio.to_thread(self.prepare_inputs, image_data, image)
+        state = self._initial_state(image_bytes, pil_image, user_prompt)
+        return await self._run_request(state)
+
+    async def process_request_batch(self, image_data: bytes, user_prompts: List[Optional[str]]) -> List[Dict]:
+        """
+        Several questions about the same photo: the upload is downscaled and
+        decoded once, then every prompt runs concurrently against that image.
+        Results come back in prompt order.
+        """
+        image_bytes, pil_image = await asyncio.to_thread(self.prepare_inputs, image_data)
+        return list(await asyncio.gather(*[
+            self._run_request(self._initial_state(image_bytes, pil_image, prompt))
+            for prompt in user_prompts
+        ]))
+
+    async def _run_request(self, state: RepairState):
         self._log(state, "Starting Repair Analysis Session.")
         
         # 1. Scene Analysis & Target Lock
@@ -286,7 +523,7 @@ class RepairBrain:
         
         # Kick off exploded-view 3D model generation in parallel (once we know device name)
         trellis_task = asyncio.create_task(
-            asyncio.to_thread(generate_exploded_model_url, state["image_bytes"], state["target_device"])
+            generate_exploded_model_url(state["image_bytes"], state["target_device"])
         )
         
         # 2. Check Verified (Path A)
@@ -294,10 +531,14 @@ class RepairBrain:
         
         if state.get("is_verified"):
             self._log(state, "Path A Selected: Using Official Guide.")
-            # Polish iFixit steps for user-friendliness
-            self._log(state, "Polishing steps for clarity and user-friendliness...")
-            polished_steps = await self.polish_all_steps(state["repair_steps"])
-            self._log(state, f"Successfully polished {len(polished_steps)} steps.")
+            # iFixit steps are human-edited; only polish unusually wordy guides
+            if self._needs_polish(state["repair_steps"]):
+                self._log(state, "Polishing steps for clarity and user-friendliness...")
+                polished_steps = await self.polish_all_steps(state["repair_steps"])
+                self._log(state, f"Successfully polished {len(polished_steps)} steps.")
+            else:
+                polished_steps = state["repair_steps"]
+                self._log(state, "Official steps are already readable; skipping polish.")
             
             model_url = await trellis_task
             
@@ -316,43 +557,32 @@ class RepairBrain:
             self._log(state, "Engaging Generative Repair Logic while 3D model renders...")
             gen_result = await self.generative_reasoning_node(state)
             state.update(gen_result)
-            
-            # Polish AI-generated steps for user-friendliness
-            self._log(state, "Polishing steps for clarity and user-friendliness...")
-            polished_steps = await self.polish_all_steps(state["repair_steps"])
-            self._log(state, f"Successfully polished {len(polished_steps)} steps.")
+            # Generated steps are already asked to be concise, so no polish pass
             
             model_url = await trellis_task
             
             return {
                 "source": "AI_Reasoning",
                 "device": state["target_device"],
-                "steps": polished_steps,
+                "steps": state["repair_steps"],
                 "safety": state["safety_warnings"],
                 "reasoning_log": state["reasoning_log"],
                 "model_url": model_url,
             }
 
-    async def process_request_streaming(self, image_data: bytes, user_prompt: Optional[str] = None):
+    async def process_request_streaming(self, image_data: bytes, user_prompt: Optional[str] = None, image: Optional[Image.Image] = None):
         """
         Streaming version that yields events as processing happens.
-        Yields: {"type": "log", "data": "message"} or {"type": "result", "data": {...}}
+        Yields: {"type": "log", "data": "message"}, {"type": "step", "data": {...}}
+        (one per step, as soon as the steps exist, before the 3D model is awaited)
+        or {"type": "result", "data": {...}}
         """
-        state: RepairState = {
-            "image_bytes": image_data,
-            "user_prompt": user_prompt,
-            "reasoning_log": [],
-            "detected_objects": [],
-            "target_device": "",
-            "is_verified": False,
-            "repair_steps": [],
-            "safety_warnings": [],
-            "guides_available": []
-        }
+        image_bytes, pil_image = await asyncio.to_thread(self.prepare_inputs, image_data, image)
+        state = self._initial_state(image_bytes, pil_image, user_prompt)
         
         def stream_log(message: str):
             """Helper to log and yield event"""
-            print(f"Brain: {message}")
+            logger.info("Brain: %s", message)
             state['reasoning_log'].append(message)
             return {"type": "log", "data": message}
         
@@ -369,7 +599,7 @@ class RepairBrain:
         # Kick off exploded-view 3D model generation in parallel (once we know device name)
         yield stream_log("Launching exploded 3D model generation in parallel...")
         trellis_task = asyncio.create_task(
-            asyncio.to_thread(generate_exploded_model_url, state["image_bytes"], state["target_device"])
+            generate_exploded_model_url(state["image_bytes"], state["target_device"])
         )
         
         # 2. Check Verified (Path A)
@@ -380,10 +610,16 @@ class RepairBrain:
         if state.get("is_verified"):
             yield stream_log("Path A Selected: Using Official Guide.")
             yield stream_log(f"Found {len(state.get('guides_available', []))} verified guides.")
-            yield stream_log("Polishing steps for clarity...")
-            
-            polished_steps = await self.polish_all_steps(state["repair_steps"])
-            yield stream_log(f"Successfully polished {len(polished_steps)} steps.")
+            # iFixit steps are human-edited; only polish unusually wordy guides
+            if self._needs_polish(state["repair_steps"]):
+                yield stream_log("Polishing steps for clarity...")
+                polished_steps = await self.polish_all_steps(state["repair_steps"])
+                yield stream_log(f"Successfully polished {len(polished_steps)} steps.")
+            else:
+                polished_steps = state["repair_steps"]
+                yield stream_log("Official steps are already readable; skipping polish.")
+            for step in polished_steps:
+                yield {"type": "step", "data": step}
             
             model_url = await trellis_task
             
@@ -406,18 +642,16 @@ class RepairBrain:
             gen_result = await self.generative_reasoning_node(state)
             state.update(gen_result)
             yield stream_log(f"Generated {len(state['repair_steps'])} repair steps.")
-            
-            # Polish AI-generated steps
-            yield stream_log("Polishing steps for clarity...")
-            polished_steps = await self.polish_all_steps(state["repair_steps"])
-            yield stream_log(f"Successfully polished {len(polished_steps)} steps.")
+            # Generated steps are already asked to be concise, so no polish pass
+            for step in state["repair_steps"]:
+                yield {"type": "step", "data": step}
             
             model_url = await trellis_task
             
             result = {
                 "source": "AI_Reasoning",
                 "device": state["target_device"],
-                "steps": polished_steps,
+                "steps": state["repair_steps"],
                 "safety": state["safety_warnings"],
                 "reasoning_log": state["reasoning_log"],
                 "model_url": model_url,
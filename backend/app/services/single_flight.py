@@ -0,0 +1,29 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, MutableMapping
+
+async def cached_single_flight(
+    cache: MutableMapping,
+    locks: Dict[Hashable, asyncio.Lock],
+    key: Hashable,
+    compute: Callable[[], Awaitable[Any]],
+):
+    """
+    Returns cache[key], computing it with `compute()` on a miss. Concurrent
+    misses for the same key share one computation (single-flight). Falsy
+    results and exceptions aren't cached, so transient errors don't stick.
+    """
+    if key in cache:
+        return cache[key]
+
+    lock = locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            if key in cache:
+                return cache[key]
+            result = await compute()
+            if result:
+                cache[key] = result
+            return result
+    finally:
+        if not lock.locked():
+            locks.pop(key, None)
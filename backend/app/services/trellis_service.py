@@ -1,15 +1,19 @@
-import base64
 import io
 import os
-import tempfile
+import asyncio
+import hashlib
+import time
 from typing import Any, Dict, Optional
 
 import fal_client
 from google import genai
 from google.genai import types
 from PIL import Image
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
+from app.services.single_flight import cached_single_flight
+
 load_dotenv()
 
 FAL_KEY = os.environ.get("FAL_KEY")
@@ -17,17 +21,31 @@ GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 api_key = os.environ.get("GOOGLE_API_KEY")
 client = genai.Client(api_key=GOOGLE_API_KEY)
 
+# Trellis renders take tens of seconds; the same (photo, device) pair reuses the URL.
+# Entries carry their write time and expire like the Gemini results (24h), so a
+# hosted file that stops resolving is re-rendered instead of served forever.
+CACHE_DIR = os.path.join(".cache", "trellis")
+MODEL_URL_TTL = 24 * 3600
+# In-process layer: concurrent identical renders (e.g. process_request_batch)
+# share one call. Short TTL, so the disk entry's expiry stays authoritative.
+_url_cache = TTLCache(maxsize=128, ttl=600)
+_url_locks: Dict[str, asyncio.Lock] = {}
+
 
-def _encode_image_bytes_to_data_url(image_bytes: bytes) -> str:
+def _prepare_trellis_png(image_bytes: bytes) -> bytes:
     """
-    Takes raw image bytes, converts to 1024x1024 PNG, and encodes as data URL.
+    Takes raw image bytes and converts them to a 1024x1024 PNG for Trellis.
     """
     with Image.open(io.BytesIO(image_bytes)) as img:
-        img = img.convert("RGBA")
-
         # Resize / letterbox to square 1024x1024
         target_size = 1024
-        img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS)
+        img.draft("RGB", (target_size, target_size)) # JPEG: let libjpeg downscale during decode
+        if img.mode in ("1", "P"):
+            img = img.convert("RGBA") # Palette/bilevel images only resize with NEAREST
+        # Shrink first, then convert, so the RGBA copy is made at 1024px rather than full size
+        img.thumbnail((target_size, target_size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        if img.mode != "RGBA":
+            img = img.convert("RGBA")
 
         canvas = Image.new("RGBA", (target_size, target_size), (0, 0, 0, 0))
         paste_x = (target_size - img.width) // 2
@@ -35,33 +53,30 @@ def _encode_image_bytes_to_data_url(image_bytes: bytes) -> str:
         canvas.paste(img, (paste_x, paste_y))
 
         buf = io.BytesIO()
-        canvas.save(buf, format="PNG")
-        png_bytes = buf.getvalue()
+        # Fast zlib level: the PNG is uploaded once, so encode time beats a few KB
+        canvas.save(buf, format="PNG", compress_level=1)
+        return buf.getvalue()
 
-    encoded = base64.b64encode(png_bytes).decode("utf-8")
-    return f"data:image/png;base64,{encoded}"
 
-
-def _find_model_mesh(node: Any) -> Optional[Dict[str, Any]]:
+def _find_model_mesh(root: Any) -> Optional[Dict[str, Any]]:
     """
-    Recursively search a nested JSON-like structure for a `model_mesh` dict.
+    Depth-first search of a nested JSON-like structure for a `model_mesh` dict.
+    Iterative (explicit stack), stopping at the first hit.
     """
-    if isinstance(node, dict):
-        if "model_mesh" in node and isinstance(node["model_mesh"], dict):
-            return node["model_mesh"]
-        for value in node.values():
-            found = _find_model_mesh(value)
-            if found is not None:
-                return found
-    elif isinstance(node, list):
-        for item in node:
-            found = _find_model_mesh(item)
-            if found is not None:
-                return found
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            mesh = node.get("model_mesh")
+            if isinstance(mesh, dict):
+                return mesh
+            stack.extend(reversed(node.values())) # Reversed so pop() keeps document order
+        elif isinstance(node, list):
+            stack.extend(reversed(node))
     return None
 
 
-def _generate_exploded_view_image_bytes(_: bytes, device_name: Optional[str]) -> Optional[bytes]:
+async def _generate_exploded_view_image_bytes(_: bytes, device_name: Optional[str]) -> Optional[bytes]:
     """
     Uses Gemini to generate an exploded-view illustration (like explode.py).
 
@@ -81,7 +96,7 @@ def _generate_exploded_view_image_bytes(_: bytes, device_name: Optional[str]) ->
 
     try:
         print("TrellisService: Calling Gemini to generate exploded-view illustration...")
-        response = client.models.generate_content(
+        response = await client.aio.models.generate_content(
             model="gemini-2.5-flash-image",
             contents=[prompt],
             config=types.GenerateContentConfig(
@@ -95,29 +110,16 @@ def _generate_exploded_view_image_bytes(_: bytes, device_name: Optional[str]) ->
             ),
         )
 
-        # Mirror explode.py logic: grab first inline image, but return PNG bytes
+        # Mirror explode.py logic: grab first inline image, but return its bytes
         for part in response.candidates[0].content.parts:
             if part.text:
                 print(part.text)
             elif part.inline_data:
-                img = part.as_image()  # PIL.Image
-
-                # part.as_image().save expects a filesystem path (as in explode.py),
-                # so we save to a temporary file and then read the bytes back.
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                    temp_path = tmp.name
-
-                try:
-                    img.save(temp_path)
-                    with open(temp_path, "rb") as f:
-                        png_bytes = f.read()
-                    print("TrellisService: Exploded-view image generated.")
-                    return png_bytes
-                finally:
-                    try:
-                        os.remove(temp_path)
-                    except OSError:
-                        pass
+                # The inline blob already holds the encoded image (PNG from this model),
+                # so hand the bytes straight on; _prepare_trellis_png decodes any format.
+                # No temp-file save/read-back round-trip.
+                print("TrellisService: Exploded-view image generated.")
+                return part.inline_data.data
 
         print("TrellisService: No inline image found in Gemini response.")
         return None
@@ -126,7 +128,7 @@ def _generate_exploded_view_image_bytes(_: bytes, device_name: Optional[str]) ->
         return None
 
 
-def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
+async def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
     """
     Calls fal-ai Trellis and returns the hosted 3D asset URL (GLB/USDZ/etc).
 
@@ -137,7 +139,14 @@ def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
         return None
 
     print("TrellisService: Preprocessing image for Trellis...")
-    data_url = _encode_image_bytes_to_data_url(image_bytes)
+    png_bytes = await asyncio.to_thread(_prepare_trellis_png, image_bytes)
+
+    try:
+        # Binary upload instead of a base64 data URL (~33% fewer bytes on the wire)
+        image_url = await fal_client.upload_async(png_bytes, "image/png")
+    except Exception as e:
+        print(f"TrellisService Error: fal_client.upload failed: {e}")
+        return None
 
     def on_queue_update(update):
         if isinstance(update, fal_client.InProgress):
@@ -146,11 +155,11 @@ def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
                 print(f"TrellisService Log: {msg}")
 
     try:
-        print("TrellisService: Calling fal-ai/trellis via fal_client.subscribe...")
-        result = fal_client.subscribe(
+        print("TrellisService: Calling fal-ai/trellis via fal_client.subscribe_async...")
+        result = await fal_client.subscribe_async(
             "fal-ai/trellis",
             arguments={
-                "image_url": data_url,
+                "image_url": image_url,
                 "slat_cfg_scale": 3,
                 "ss_cfg_scale": 7.5,
                 "slat_sampling_steps": 25,
@@ -161,7 +170,7 @@ def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
             on_queue_update=on_queue_update,
         )
     except Exception as e:
-        print(f"TrellisService Error: fal_client.subscribe failed: {e}")
+        print(f"TrellisService Error: fal_client.subscribe_async failed: {e}")
         return None
 
     try:
@@ -182,18 +191,58 @@ def generate_trellis_model_url(image_bytes: bytes) -> Optional[str]:
         return None
 
 
-def generate_exploded_model_url(original_image_bytes: bytes, device_name: Optional[str]) -> Optional[str]:
+def _model_url_key(image_bytes: bytes, device_name: Optional[str]) -> str:
+    h = hashlib.blake2b(image_bytes, digest_size=16)
+    h.update((device_name or "").encode())
+    return h.hexdigest()
+
+
+def _read_cached_url(cache_path: str) -> Optional[str]:
+    # File format: "<unix time written>\n<url>"; older/garbled files count as expired
+    try:
+        with open(cache_path) as f:
+            written, url = f.read().split("\n", 1)
+        if time.time() - float(written) < MODEL_URL_TTL and url.strip():
+            return url.strip()
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+async def generate_exploded_model_url(original_image_bytes: bytes, device_name: Optional[str]) -> Optional[str]:
     """
     Full visual pipeline:
       1. Generate an exploded-view diagram with Gemini (like explode.py).
       2. Send that exploded image to Trellis to get a 3D exploded model URL.
 
+    Fully async: both remote calls are awaited on the event loop, so the
+    tens-of-seconds render overlaps the repair analysis without pinning a thread.
+
     If exploded-view generation fails, we fall back to using the original image.
     """
-    exploded = _generate_exploded_view_image_bytes(original_image_bytes, device_name)
+    key = _model_url_key(original_image_bytes, device_name)
+    return await cached_single_flight(
+        _url_cache, _url_locks, key,
+        lambda: _render_model_url(original_image_bytes, device_name, key),
+    )
+
+
+async def _render_model_url(original_image_bytes: bytes, device_name: Optional[str], key: str) -> Optional[str]:
+    cache_path = os.path.join(CACHE_DIR, f"{key}.txt")
+    url = _read_cached_url(cache_path)
+    if url:
+        print(f"TrellisService: Cache hit, reusing model URL: {url}")
+        return url
+
+    exploded = await _generate_exploded_view_image_bytes(original_image_bytes, device_name)
     if not exploded:
         print("TrellisService: Exploded view generation failed; skipping 3D model generation.")
         return None
 
-    return generate_trellis_model_url(exploded)
-
+    url = await generate_trellis_model_url(exploded)
+    if url:
+        # Only successful renders are cached, so failures are retried next time
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w") as f:
+            f.write(f"{time.time()}\n{url}")
+    return url
@@ -1,19 +1,45 @@
 import io
 import os
-from typing import List, Dict, Any
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Any, Optional
 from PIL import Image
 import numpy as np
 
 try:
+    import torch
     from ultralytics import SAM
 except ImportError:
+    torch = None
     SAM = None
 
 from app.core.config import settings
 
+@dataclass(slots=True)
+class Mask:
+    """
+    One segmented part. orjson serializes it like the dict it replaces
+    ({"label", "confidence", "bbox", "polygon"}), so the API shape is unchanged.
+    """
+    label: str
+    confidence: float
+    bbox: List[float]
+    polygon: Any # (N, 2) float32 array, or [[x, y], ...] for mock data
+
 class VisionEngine:
     def __init__(self):
         self.model = None
+        # Masks keyed by upload hash: the same photo re-sent (Explode View clicked
+        # again, another tab) skips SAM entirely. Ultralytics' segment-everything
+        # mode doesn't reuse predictor.features, so cache the result, not the embedding
+        self._mask_cache = OrderedDict()
+        self._mask_cache_size = 32
+        # The ultralytics predictor isn't thread-safe: warmup and requests take turns
+        self._infer_lock = threading.Lock()
+        self._half = False
         if SAM:
             try:
                 # Use configured path or default to a small SAM 2 model
@@ -27,6 +53,8 @@ class VisionEngine:
                 
                 print(f"Loading Vision Engine with model: {model_name}...")
                 self.model = SAM(model_name)
+                if torch.cuda.is_available():
+                    self._accelerate()
                 print("Vision Engine Initialized (Active Mode)")
             except Exception as e:
                 print(f"Vision Engine Warning: Failed to load SAM model: {e}")
@@ -34,47 +62,106 @@ class VisionEngine:
         else:
             print("Vision Engine Warning: 'ultralytics' not installed. Running in Mock Mode.")
 
-    async def generate_masks(self, image_bytes: bytes) -> List[Dict[str, Any]]:
+    def _accelerate(self):
+        """
+        CUDA only: run the predictor in fp16 and compile the ViT image encoder,
+        which dominates SAM's cost. Input is always resized to 1024px, so the
+        compiled graph sees one static shape (the warmup pass pays the compile).
+        """
+        self._half = True
+        try:
+            sam = self.model.model
+            sam.image_encoder = torch.compile(sam.image_encoder)
+            print("Vision Engine: fp16 + compiled image encoder enabled")
+        except Exception as e:
+            print(f"Vision Engine Warning: torch.compile skipped ({e})")
+
+    def _predict(self, image):
+        # Ultralytics' SAM predictor only takes one image per call (no batching)
+        with self._infer_lock:
+            return self.model(image, conf=0.25, half=self._half)
+
+    def _warmup(self):
+        """
+        Dummy forward pass so the predictor, CUDA context and kernels are set up
+        before the first real request. Blocking; run it off the event loop.
+        """
+        if not self.model:
+            return
+        try:
+            with self._infer_lock:
+                self.model(Image.new("RGB", (64, 64)), conf=0.25, half=self._half, verbose=False)
+            print("Vision Engine: Warmed up")
+        except Exception as e:
+            print(f"Vision Engine Warning: Warmup skipped ({e})")
+
+    async def warmup(self):
+        """
+        Non-blocking _warmup: runs the dummy pass in a worker thread, so callers
+        can start it as a task and keep doing other setup meanwhile.
+        """
+        await asyncio.to_thread(self._warmup)
+
+    async def generate_masks(self, image_bytes: bytes, image: Optional[Image.Image] = None) -> List[Mask]:
         """
         Runs SAM 3 (via Ultralytics SAM 2) to generate segmentation masks.
+        `image` is an already-decoded copy of `image_bytes`, if the caller has one.
         """
         if not self.model:
             return self._mock_response()
 
+        key = hashlib.blake2b(image_bytes, digest_size=16).digest()
+        if key in self._mask_cache:
+            print("Vision Engine: Reusing cached masks for this image")
+            self._mask_cache.move_to_end(key)
+            return self._mask_cache[key]
+
         try:
-            # Convert bytes to PIL Image
-            image = Image.open(io.BytesIO(image_bytes))
+            scale = 1
+            if image is None:
+                # Convert bytes to PIL Image
+                image = Image.open(io.BytesIO(image_bytes))
+                # SAM works at 1024px anyway: let libjpeg subsample during decode (JPEG
+                # only, by 1/2-1/8 while staying >= 1024), then map results back to full size
+                full_w = image.width
+                image.draft("RGB", (1024, 1024))
+                scale = full_w / image.width
             
-            # Run inference
-            # segment() returns a list of Results objects
-            results = self.model(image, conf=0.25) 
+            # Run inference in a worker thread so the event loop keeps serving
+            # other requests (e.g. /analyze-stream) while SAM runs
+            results = await asyncio.to_thread(self._predict, image)
             
             masks_response = []
             
             for result in results:
                 if result.masks:
+                    # One device->host copy per result instead of one sync per detection
+                    boxes = result.boxes
+                    xyxy = boxes.xyxy.cpu().numpy() * scale if boxes else None
+                    confs = boxes.conf.cpu().numpy() if boxes and boxes.conf is not None else None
+
                     # result.masks.xy is a list of polygon coordinates (pixels)
                     for i, seg in enumerate(result.masks.xy):
-                        # seg is a numpy array of shape (N, 2)
-                        polygon = seg.tolist()
+                        # seg is a numpy array of shape (N, 2). Kept as an array: the
+                        # router serializes it with orjson straight to [[x, y], ...]
+                        # instead of materializing a Python float per coordinate
+                        polygon = np.ascontiguousarray(seg * scale if scale != 1 else seg, dtype=np.float32)
                         
                         # Get bounding box
-                        box = result.boxes.xyxy[i].tolist() if result.boxes else []
+                        box = xyxy[i].tolist() if xyxy is not None else []
                         
                         # Get confidence
-                        conf = float(result.boxes.conf[i]) if result.boxes and result.boxes.conf is not None else 0.95
+                        conf = float(confs[i]) if confs is not None else 0.95
 
-                        masks_response.append({
-                            "label": f"Part_{i+1}",
-                            "confidence": conf,
-                            "bbox": box,
-                            "polygon": polygon
-                        })
+                        masks_response.append(Mask(f"Part_{i+1}", conf, box, polygon))
             
             if not masks_response:
                 print("No masks detected by SAM, returning mock data for visualization.")
                 return self._mock_response()
-                
+            
+            self._mask_cache[key] = masks_response
+            if len(self._mask_cache) > self._mask_cache_size:
+                self._mask_cache.popitem(last=False) # Evict oldest
             return masks_response
 
         except Exception as e:
@@ -86,16 +173,16 @@ class VisionEngine:
         Returns fake coordinates so the frontend has something to draw if AI fails.
         """
         return [
-            {
-                "label": "Battery_Mock",
-                "confidence": 0.98,
-                "bbox": [100, 100, 300, 400], 
-                "polygon": [[100, 100], [300, 100], [300, 400], [100, 400]]
-            },
-            {
-                "label": "Screw_Mock",
-                "confidence": 0.95,
-                "bbox": [50, 50, 70, 70],
-                "polygon": [[50, 50], [70, 50], [70, 70], [50, 70]]
-            }
+            Mask(
+                label="Battery_Mock",
+                confidence=0.98,
+                bbox=[100, 100, 300, 400],
+                polygon=[[100, 100], [300, 100], [300, 400], [100, 400]]
+            ),
+            Mask(
+                label="Screw_Mock",
+                confidence=0.95,
+                bbox=[50, 50, 70, 70],
+                polygon=[[50, 50], [70, 50], [70, 70], [50, 70]]
+            )
         ]
@@ -0,0 +1,66 @@
+import os
+import hashlib
+from pathlib import Path
+from typing import List, Optional
+
+import orjson
+
+# Re-running the manual tests with the same sample photo and prompt replays the
+# last result from disk instead of paying for Gemini/iFixit/Trellis again.
+# Set REFRESH=1 to bypass it.
+CACHE_DIR = Path(".cache") / "repair_results"
+
+def _cache_path(image_data: bytes, user_prompt: Optional[str]) -> Path:
+    h = hashlib.blake2b(image_data, digest_size=16)
+    h.update(b"|" + (user_prompt or "").encode())
+    return CACHE_DIR / f"{h.hexdigest()}.json"
+
+def is_cached(image_data: bytes, user_prompt: Optional[str] = None) -> bool:
+    # Lets a script skip building the engines when every result will be replayed
+    return os.environ.get("REFRESH") != "1" and _cache_path(image_data, user_prompt).exists()
+
+async def cached_stream_request(brain, image_data: bytes, user_prompt: Optional[str] = None, image=None):
+    """
+    Yields brain.process_request_streaming events as they arrive. A cached
+    result is replayed as the same log/step/result events.
+    """
+    path = _cache_path(image_data, user_prompt)
+    if os.environ.get("REFRESH") != "1" and path.exists():
+        print(f"Cache hit! Replaying {path}")
+        result = orjson.loads(path.read_bytes())
+        for log in result.get("reasoning_log", []):
+            yield {"type": "log", "data": log}
+        for step in result.get("steps", []):
+            yield {"type": "step", "data": step}
+        yield {"type": "result", "data": result}
+        return
+
+    async for event in brain.process_request_streaming(image_data, user_prompt, image=image):
+        if event["type"] == "result":
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(orjson.dumps(event["data"], option=orjson.OPT_INDENT_2))
+        yield event
+
+async def cached_process_request_batch(brain, image_data: bytes, user_prompts: List[Optional[str]]) -> List[dict]:
+    """
+    Prompts already on disk are replayed, the rest go to
+    brain.process_request_batch together. Results come back in prompt order.
+    """
+    refresh = os.environ.get("REFRESH") == "1"
+    paths = [_cache_path(image_data, prompt) for prompt in user_prompts]
+    results = [None] * len(user_prompts)
+    misses = []
+    for i, path in enumerate(paths):
+        if not refresh and path.exists():
+            print(f"Cache hit! Replaying {path}")
+            results[i] = orjson.loads(path.read_bytes())
+        else:
+            misses.append(i)
+
+    if misses:
+        fresh = await brain.process_request_batch(image_data, [user_prompts[i] for i in misses])
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        for i, result in zip(misses, fresh):
+            paths[i].write_bytes(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+            results[i] = result
+    return results
@@ -0,0 +1,20 @@
+import asyncio
+
+from app.services.factories import close_engines
+from app.test.runner import run
+from app.test.test_iphone import test_iphone
+from app.test.testcot import test_cot
+
+# Runs both manual scripts on one event loop, so they share the engines' pooled
+# HTTP connections (iFixit, Gemini) and the default thread pool instead of each
+# asyncio.run() building and tearing those down again.
+# Run from backend/: python -m app.test.run_all
+
+async def main():
+    try:
+        await asyncio.gather(test_iphone(), test_cot())
+    finally:
+        await close_engines()
+
+if __name__ == "__main__":
+    run(main())
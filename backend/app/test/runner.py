@@ -0,0 +1,12 @@
+import asyncio
+
+try:
+    import uvloop # Optional: libuv-based event loop, cheaper task switching
+except ImportError:
+    uvloop = None
+
+def run(coro):
+    """
+    Runs a manual test script's coroutine, on uvloop when it's installed.
+    """
+    return (uvloop.run if uvloop else asyncio.run)(coro)
@@ -1,58 +1,76 @@
 import asyncio
-import os
-import sys
+from pathlib import Path
 
-# Add project root to python path
-sys.path.append(os.getcwd())
+# Resolve project paths properly (run from backend/: python -m app.test.test_iphone)
+CURRENT_DIR = Path(__file__).resolve().parent          # app/test/
+SAMPLE_PATH = CURRENT_DIR.parent / "sample" / "broken_iphone.jpg"  # app/sample/broken_iphone.jpg
 
-from app.services.reasoning_brain import RepairBrain
-from app.services.vision_engine import VisionEngine
+from app.services.factories import get_brain, get_vision
+from app.test.result_cache import cached_stream_request
+from app.test.runner import run
 
 async def test_iphone():
-    image_path = "app/sample/broken_iphone.jpg"
+    image_path = SAMPLE_PATH
     
-    if not os.path.exists(image_path):
+    if not image_path.exists():
         print(f"Error: Image not found at {image_path}")
         return
 
     print(f"Loading image from {image_path}...")
-    with open(image_path, "rb") as f:
-        image_data = f.read()
+    # Read the image while both engines load (SAM weights, Gemini client) in worker threads
+    image_data, vision, brain = await asyncio.gather(
+        asyncio.to_thread(image_path.read_bytes),
+        asyncio.to_thread(get_vision),
+        asyncio.to_thread(get_brain),
+    )
+    # Pay SAM's first-inference setup while the image is decoded below
+    warmup_task = asyncio.create_task(vision.warmup())
+    # Downscale (with the brain's own 1024px JPEG resize) and decode once; both engines
+    # take the decoded image, and the brain's downscale is then a no-op.
+    # Off the loop too, so the warmup task actually starts alongside it
+    image_data, image = await asyncio.to_thread(brain.prepare_inputs, image_data)
 
     print("\n--- Testing Vision Engine (Segmentation) ---")
-    vision = VisionEngine()
     try:
-        masks = await vision.generate_masks(image_data)
+        await warmup_task
+        masks = await vision.generate_masks(image_data, image=image)
         print(f"Successfully generated {len(masks)} masks.")
-        # Print first few masks
-        for i, mask in enumerate(masks[:3]):
-            print(f"  Mask {i+1}: {mask.get('label')} (Conf: {mask.get('confidence'):.2f})")
+        # Print first few masks (one write for the whole block)
+        print("\n".join(
+            f"  Mask {i+1}: {mask.label} (Conf: {mask.confidence:.2f})"
+            for i, mask in enumerate(masks[:3])
+        ))
     except Exception as e:
         print(f"Vision Engine failed: {e}")
 
     print("\n--- Testing Repair Brain (Analysis with CoT) ---")
-    brain = RepairBrain()
     user_prompt = "The back glass is shattered."
     print(f"User Context: '{user_prompt}'")
     
     try:
-        result = await brain.process_request(image_data, user_prompt)
-        
+        # Print the trace and steps as they arrive instead of after the whole run
+        print("\n--- Reasoning Trace ---")
+        result = {}
+        n_steps = 0
+        async for event in cached_stream_request(brain, image_data, user_prompt, image=image):
+            if event["type"] == "log":
+                print(f"  > {event['data']}")
+            elif event["type"] == "step":
+                step = event["data"]
+                if n_steps == 0:
+                    print("\n--- Repair Steps ---")
+                n_steps += 1
+                if n_steps <= 3: # Show first 3
+                    print(f"  {step.get('step')}. {step.get('instruction')}")
+                    if step.get('warning'):
+                        print(f"     [!] {step.get('warning')}")
+            elif event["type"] == "result":
+                result = event["data"]
+
+        print(f"Found {n_steps} steps.")
         print(f"\nFinal Target: {result.get('device')}")
         print(f"Source: {result.get('source')}")
         
-        print("\n--- Reasoning Trace ---")
-        for log in result.get('reasoning_log', []):
-            print(f"  > {log}")
-            
-        print("\n--- Repair Steps ---")
-        steps = result.get('steps', [])
-        print(f"Found {len(steps)} steps.")
-        for step in steps[:3]: # Show first 3
-            print(f"  {step.get('step')}. {step.get('instruction')}")
-            if step.get('warning'):
-                print(f"     [!] {step.get('warning')}")
-        
         if result.get('guides_available'):
             print(f"\n(Found {len(result.get('guides_available'))} verified iFixit guides available)")
 
@@ -60,4 +78,4 @@ async def test_iphone():
         print(f"Repair Brain failed: {e}")
 
 if __name__ == "__main__":
-    asyncio.run(test_iphone())
\ No newline at end of file
+    run(test_iphone())
\ No newline at end of file